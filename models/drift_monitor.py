@@ -0,0 +1,427 @@
+"""
+Input Drift Monitor for the Fertilizer Recommendation Model
+Keeps bounded-memory streaming statistics of the inputs seen at serving time
+and compares them against the reference profile saved at training time
+"""
+
+import sys
+import json
+import math
+import os
+import time
+import tempfile
+from bisect import bisect_right
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Get the directory where this script is located
+MODEL_DIR = Path(__file__).parent
+
+PROFILE_PATH = MODEL_DIR / "reference_profile.json"
+STATE_PATH = MODEL_DIR / "drift_state.json"
+
+# Set to 0 to skip the per-request state update. Monitoring also skips itself
+# quietly when the models directory is not writable (read-only deployments).
+ENABLE_ENV_VAR = "FERTILIZER_DRIFT_MONITOR"
+
+# Feature list matching Mainmodel.py
+SENSOR_FEATURES = [
+    "sensor_nitrogen",
+    "sensor_phosphorus",
+    "sensor_potassium",
+    "soil_pH",
+    "soil_moisture_percent",
+    "soil_electrical_conductivity_us_cm",
+    "soil_temperature_celsius",
+]
+
+N_BINS = 10               # Quantile bins per feature in the reference profile
+PSI_THRESHOLD = 0.2       # PSI above this is treated as significant drift
+UNSEEN_CROP_THRESHOLD = 0.05
+MIN_SAMPLES_PER_BIN = 50  # Don't score a histogram before this many samples per bin
+MIN_UNSEEN_SAMPLES = 100  # Don't judge the unseen crop rate before this many inputs
+DECAY_WINDOW = 2000       # Counters decay by 1/DECAY_WINDOW per update, so old inputs fade out
+MAX_UNSEEN_CROPS = 20     # Distinct unseen crop names tracked before lumping into "__other__"
+MIN_UNSEEN_WEIGHT = 0.5   # Unseen crop names decayed below this are dropped from the tally
+EPSILON = 1e-4            # Smoothing for empty bins in PSI
+
+
+def build_reference_profile(df, crop_col="crop_type", n_bins=N_BINS):
+    """
+    Build the training-time reference profile from the cleaned training frame.
+
+    For each sensor feature the profile stores the quantile cut points and the
+    share of training rows falling in each bin, overall and per crop. Bins are
+    laid out as [below training min, n_bins quantile bins, above training max].
+    """
+    def bin_shares(values, cuts, lo, hi):
+        counts = _empty_bins(cuts)
+        for v in values:
+            counts[_bin_index(v, cuts, lo, hi)] += 1
+        total = max(len(values), 1)
+        return [c / total for c in counts]
+
+    columns = {col: [float(v) for v in df[col]] for col in SENSOR_FEATURES}
+    crop_values = [str(c) for c in df[crop_col]]
+    n_samples = len(crop_values)
+
+    features = {}
+    for col in SENSOR_FEATURES:
+        ordered = sorted(columns[col])
+        lo, hi = ordered[0], ordered[-1]
+        cuts = []
+        for i in range(1, n_bins):
+            cut = ordered[min(len(ordered) - 1, int(i * len(ordered) / n_bins))]
+            if not cuts or cut > cuts[-1]:
+                cuts.append(cut)
+        features[col] = {
+            "min": lo,
+            "max": hi,
+            "cuts": cuts,
+            "expected": bin_shares(columns[col], cuts, lo, hi),
+        }
+
+    crops = {}
+    for crop in sorted(set(crop_values)):
+        rows = [i for i, c in enumerate(crop_values) if c == crop]
+        crops[crop] = {
+            "share": len(rows) / n_samples,
+            "expected": {
+                col: bin_shares(
+                    [columns[col][i] for i in rows],
+                    features[col]["cuts"], features[col]["min"], features[col]["max"],
+                )
+                for col in SENSOR_FEATURES
+            },
+        }
+
+    return {
+        "n_samples": n_samples,
+        "features": features,
+        "crops": crops,
+    }
+
+
+def save_reference_profile(profile, path=PROFILE_PATH):
+    """Write the reference profile next to the model artifacts"""
+    _atomic_write_json(profile, path)
+
+
+def load_reference_profile(path=PROFILE_PATH):
+    """Load the reference profile, or None if the model was trained without one"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _empty_bins(cuts):
+    # Underflow + (len(cuts) + 1) quantile bins + overflow
+    return [0] * (len(cuts) + 3)
+
+
+def _bin_index(value, cuts, lo, hi):
+    if value < lo:
+        return 0
+    # NaN fails every comparison, so route it (and +inf) to the overflow bin
+    if not math.isfinite(value) or value > hi:
+        return len(cuts) + 2
+    return 1 + bisect_right(cuts, value)
+
+
+def _min_samples(n_bins, per_bin=MIN_SAMPLES_PER_BIN):
+    # PSI sampling noise shrinks with samples per bin, not with total samples
+    return per_bin * n_bins
+
+
+def _psi(expected, observed_counts):
+    """Population Stability Index between reference shares and observed counts"""
+    total = sum(observed_counts)
+    if total == 0:
+        return 0.0
+    score = 0.0
+    for e, c in zip(expected, observed_counts):
+        e = max(e, EPSILON)
+        a = max(c / total, EPSILON)
+        score += (a - e) * math.log(a / e)
+    return score
+
+
+def _atomic_write_json(obj, path):
+    # Write to a temp file and rename so concurrent readers never see a partial file
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(obj, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def _state_lock(state_path):
+    # Serialise load -> update -> save across the per-request prediction processes
+    lock_path = Path(str(state_path) + ".lock")
+    with open(lock_path, "a+") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            # msvcrt locks a byte range from the current position; LK_LOCK gives up after ~10s
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _decay(counts, factor):
+    return [c * factor for c in counts]
+
+
+class DriftMonitor:
+    """
+    Streaming input statistics compared against a reference profile.
+
+    Memory is fixed by the profile: one histogram of N_BINS + 2 counters per
+    feature, overall and per known crop, plus a capped unseen-crop tally.
+    Counters decay exponentially, so the statistics describe roughly the
+    last DECAY_WINDOW inputs of each group rather than everything since training.
+    A crop with no traffic in the last DECAY_WINDOW inputs is stale: it is not
+    scored, and its histograms restart when it is next seen.
+    """
+
+    def __init__(self, profile, state=None, decay_window=DECAY_WINDOW):
+        self.profile = profile
+        self.decay_window = decay_window
+        self.decay = 1.0 - 1.0 / decay_window
+        self.state = state or self._empty_state()
+
+    def _empty_state(self):
+        features = self.profile["features"]
+        return {
+            "total": 0,
+            "count": 0.0,
+            "unseen_crop_count": 0.0,
+            "unseen_crops": {},
+            "features": {
+                col: _empty_bins(features[col]["cuts"]) for col in SENSOR_FEATURES
+            },
+            "crops": {
+                crop: self._empty_crop_state()
+                for crop in self.profile["crops"]
+            },
+        }
+
+    def _empty_crop_state(self):
+        features = self.profile["features"]
+        return {
+            "count": 0.0,
+            "last_seen": 0,
+            "features": {
+                col: _empty_bins(features[col]["cuts"]) for col in SENSOR_FEATURES
+            },
+        }
+
+    def _is_stale(self, crop_state):
+        return self.state["total"] - crop_state["last_seen"] > self.decay_window
+
+    @classmethod
+    def load(cls, profile_path=PROFILE_PATH, state_path=STATE_PATH):
+        """Load the monitor, or None if no reference profile is available"""
+        profile = load_reference_profile(profile_path)
+        if profile is None:
+            return None
+        state = None
+        state_path = Path(state_path)
+        if state_path.exists():
+            try:
+                with open(state_path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+            except (ValueError, OSError):
+                print("⚠ Drift state unreadable. Starting fresh.", file=sys.stderr)
+        monitor = cls(profile, state)
+        if not monitor._state_matches_profile():
+            # Profile changed (model retrained) - old statistics no longer apply
+            monitor.reset()
+        return monitor
+
+    def _state_matches_profile(self):
+        if not set(self._empty_state()) <= set(self.state):
+            return False
+        features = self.state["features"]
+        return (
+            set(features) == set(SENSOR_FEATURES)
+            and all(
+                len(features[col]) == len(self.profile["features"][col]["cuts"]) + 3
+                for col in SENSOR_FEATURES
+            )
+            and set(self.state["crops"]) == set(self.profile["crops"])
+            and all(
+                set(self._empty_crop_state()) <= set(crop_state)
+                for crop_state in self.state["crops"].values()
+            )
+        )
+
+    def reset(self):
+        """Clear the streaming statistics, e.g. after retraining"""
+        self.state = self._empty_state()
+
+    def save(self, state_path=STATE_PATH):
+        _atomic_write_json(self.state, state_path)
+
+    def update(self, data):
+        """Record one serving-time input (same fields as predict_fertilizer)"""
+        features = self.profile["features"]
+        decay = self.decay
+        self.state["total"] += 1
+        self.state["count"] = self.state["count"] * decay + 1
+
+        crop = str(data.get("crop_type"))
+        crop_state = self.state["crops"].get(crop)
+        unseen = self.state["unseen_crops"]
+        for name in list(unseen):
+            unseen[name] *= decay
+            if unseen[name] < MIN_UNSEEN_WEIGHT:
+                del unseen[name]
+        self.state["unseen_crop_count"] *= decay
+        if crop_state is None:
+            self.state["unseen_crop_count"] += 1
+            if crop not in unseen and len(unseen) >= MAX_UNSEEN_CROPS:
+                crop = "__other__"
+            unseen[crop] = unseen.get(crop, 0) + 1
+        else:
+            if self._is_stale(crop_state):
+                crop_state = self.state["crops"][crop] = self._empty_crop_state()
+            # Each crop decays on its own traffic so rare crops still fill a window
+            crop_state["count"] = crop_state["count"] * decay + 1
+            crop_state["last_seen"] = self.state["total"]
+
+        for col in SENSOR_FEATURES:
+            ref = features[col]
+            idx = _bin_index(float(data[col]), ref["cuts"], ref["min"], ref["max"])
+            counts = _decay(self.state["features"][col], decay)
+            counts[idx] += 1
+            self.state["features"][col] = counts
+            if crop_state is not None:
+                counts = _decay(crop_state["features"][col], decay)
+                counts[idx] += 1
+                crop_state["features"][col] = counts
+
+    def drift_scores(self, min_samples_per_bin=MIN_SAMPLES_PER_BIN, psi_threshold=PSI_THRESHOLD):
+        """
+        Summarise drift against the reference profile.
+
+        Returns per-feature PSI, the out-of-training-range rate, per-crop PSI and
+        the unseen crop rate. Each signal is gated on its own (decayed) sample size:
+
+        - overall feature PSI once the overall count reaches min_samples_per_bin
+          per bin, so sampling noise alone stays well below psi_threshold
+        - a crop's PSI once that crop's count reaches the same minimum and the
+          crop has been seen within the last decay window
+        - the unseen crop rate once the overall count reaches MIN_UNSEEN_SAMPLES
+
+        needs_retraining is set if any scored PSI exceeds psi_threshold or the
+        scored unseen crop rate exceeds UNSEEN_CROP_THRESHOLD.
+        """
+        count = self.state["count"]
+        features = self.profile["features"]
+        n_bins = max(len(features[col]["cuts"]) + 3 for col in SENSOR_FEATURES)
+        min_samples = _min_samples(n_bins, min_samples_per_bin)
+
+        feature_scores = {}
+        for col in SENSOR_FEATURES:
+            counts = self.state["features"][col]
+            feature_scores[col] = {
+                "psi": round(_psi(features[col]["expected"], counts), 4),
+                "out_of_range_rate": round((counts[0] + counts[-1]) / count, 4) if count else 0.0,
+            }
+
+        crop_scores = {}
+        for crop, crop_state in self.state["crops"].items():
+            if crop_state["count"] < min_samples or self._is_stale(crop_state):
+                continue
+            expected = self.profile["crops"][crop]["expected"]
+            crop_scores[crop] = {
+                "count": round(crop_state["count"], 1),
+                "psi": {
+                    col: round(_psi(expected[col], crop_state["features"][col]), 4)
+                    for col in SENSOR_FEATURES
+                },
+            }
+
+        unseen_rate = self.state["unseen_crop_count"] / count if count else 0.0
+        unseen_drift = count >= MIN_UNSEEN_SAMPLES and unseen_rate > UNSEEN_CROP_THRESHOLD
+        max_psi = 0.0
+        if count >= min_samples:
+            max_psi = max(s["psi"] for s in feature_scores.values())
+        for s in crop_scores.values():
+            max_psi = max(max_psi, max(s["psi"].values()))
+
+        return {
+            "total": self.state["total"],
+            "count": round(count, 1),
+            "min_samples": min_samples,
+            "max_psi": round(max_psi, 4),
+            "unseen_crop_rate": round(unseen_rate, 4),
+            "unseen_crops": {k: round(v, 1) for k, v in self.state["unseen_crops"].items()},
+            "features": feature_scores,
+            "crops": crop_scores,
+            "needs_retraining": max_psi > psi_threshold or unseen_drift,
+        }
+
+
+def monitoring_enabled():
+    """Drift monitoring is on unless FERTILIZER_DRIFT_MONITOR is set to 0/false/off"""
+    return os.environ.get(ENABLE_ENV_VAR, "1").strip().lower() not in ("0", "false", "off", "no")
+
+
+def record_input(data, profile_path=PROFILE_PATH, state_path=STATE_PATH):
+    """
+    Update the persisted streaming statistics with one serving-time input.
+    Monitoring must never break a prediction, so failures are only logged.
+    Skips quietly when disabled, untrained, or the state directory is read-only.
+    """
+    if not monitoring_enabled() or not Path(profile_path).exists():
+        return
+    if not os.access(Path(state_path).parent, os.W_OK):
+        return
+    try:
+        with _state_lock(state_path):
+            monitor = DriftMonitor.load(profile_path, state_path)
+            if monitor is None:
+                return
+            monitor.update(data)
+            monitor.save(state_path)
+    except Exception as e:
+        print(f"⚠ Drift monitoring skipped: {str(e)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    # Print the current drift report; exit code 2 signals that retraining is needed
+    monitor = DriftMonitor.load()
+    if monitor is None:
+        print(json.dumps({"error": f"Reference profile not found: {PROFILE_PATH}"}))
+        sys.exit(1)
+    report = monitor.drift_scores()
+    print(json.dumps(report, indent=2))
+    sys.exit(2 if report["needs_retraining"] else 0)
@@ -102,6 +102,14 @@ def predict_fertilizer(input_data):
     # Make prediction
     predictions = model.predict(X_scaled)
     
+    # Track input statistics against the training reference profile.
+    # Monitoring is optional - it must never block serving.
+    try:
+        from drift_monitor import record_input
+        record_input(input_data)
+    except Exception as e:
+        print(f"⚠ Drift monitoring unavailable: {str(e)}", file=sys.stderr)
+    
     # Map to fertilizer names
     target_features = [
         "Urea", "DAP", "MAP", "MOP", "SOP", "CAN", "SSP", "Ammonium Sulfate"
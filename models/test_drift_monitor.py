@@ -0,0 +1,222 @@
+"""
+Tests for the input drift monitor
+Run with: python -m pytest models/test_drift_monitor.py
+"""
+
+import csv
+import json
+import math
+import random
+from multiprocessing import Pool
+from pathlib import Path
+
+import pytest
+
+import drift_monitor as dm
+
+DATA_PATH = Path(__file__).parent.parent / "data" / "realistic_fertilizer_dataset_10k.csv"
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    """The training CSV as a list of rows with float sensor values"""
+    with open(DATA_PATH, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        for col in dm.SENSOR_FEATURES:
+            row[col] = float(row[col])
+    return rows
+
+
+@pytest.fixture(scope="module")
+def profile(dataset):
+    columns = {col: [row[col] for row in dataset] for col in dm.SENSOR_FEATURES + ["crop_type"]}
+    return dm.build_reference_profile(columns)
+
+
+def make_profile(crops=("Wheat",)):
+    cuts = [float(i) for i in range(10, 100, 10)]
+    expected = [0.0] + [0.1] * 10 + [0.0]
+    feature = {"min": 0.0, "max": 100.0, "cuts": cuts, "expected": expected}
+    return {
+        "n_samples": 1000,
+        "features": {col: dict(feature) for col in dm.SENSOR_FEATURES},
+        "crops": {
+            crop: {"share": 1.0 / len(crops), "expected": {col: expected for col in dm.SENSOR_FEATURES}}
+            for crop in crops
+        },
+    }
+
+
+def make_input(value, crop="Wheat"):
+    data = {col: value for col in dm.SENSOR_FEATURES}
+    data["crop_type"] = crop
+    return data
+
+
+def test_bin_index_at_cut_points_and_range_edges():
+    cuts = [10.0, 20.0, 30.0]
+    assert dm._bin_index(0.0, cuts, 0.0, 40.0) == 1      # training min is in range
+    assert dm._bin_index(9.99, cuts, 0.0, 40.0) == 1
+    assert dm._bin_index(10.0, cuts, 0.0, 40.0) == 2     # a cut point opens the next bin
+    assert dm._bin_index(30.0, cuts, 0.0, 40.0) == 4
+    assert dm._bin_index(40.0, cuts, 0.0, 40.0) == 4     # training max is in range
+    assert dm._bin_index(-0.01, cuts, 0.0, 40.0) == 0
+    assert dm._bin_index(40.01, cuts, 0.0, 40.0) == 5
+
+
+def test_bin_index_routes_non_finite_values_out_of_range():
+    cuts = [10.0, 20.0, 30.0]
+    overflow = len(dm._empty_bins(cuts)) - 1
+    assert dm._bin_index(float("nan"), cuts, 0.0, 40.0) == overflow
+    assert dm._bin_index(float("inf"), cuts, 0.0, 40.0) == overflow
+    assert dm._bin_index(float("-inf"), cuts, 0.0, 40.0) == 0
+
+
+def test_psi_is_zero_for_identical_distributions():
+    expected = [0.0, 0.25, 0.25, 0.5, 0.0]
+    assert dm._psi(expected, [0, 25, 25, 50, 0]) == pytest.approx(0.0)
+    assert dm._psi(expected, [0, 0, 0, 0, 0]) == 0.0
+    assert dm._psi(expected, [0, 50, 25, 25, 0]) > 0.1
+
+
+def test_unseen_crops_are_capped():
+    monitor = dm.DriftMonitor(make_profile())
+    for i in range(dm.MAX_UNSEEN_CROPS + 5):
+        monitor.update(make_input(50.0, crop=f"Crop{i}"))
+    unseen = monitor.state["unseen_crops"]
+    assert len(unseen) == dm.MAX_UNSEEN_CROPS + 1
+    assert unseen["__other__"] == pytest.approx(5, rel=0.01)
+    assert monitor.state["unseen_crop_count"] == pytest.approx(dm.MAX_UNSEEN_CROPS + 5, rel=0.01)
+
+
+def test_load_resets_state_when_profile_shape_changes(tmp_path):
+    profile_path = tmp_path / "profile.json"
+    state_path = tmp_path / "state.json"
+    dm.save_reference_profile(make_profile(), profile_path)
+    dm.record_input(make_input(50.0), profile_path, state_path)
+    assert dm.DriftMonitor.load(profile_path, state_path).state["total"] == 1
+
+    # Same profile shape keeps the statistics
+    dm.save_reference_profile(make_profile(), profile_path)
+    assert dm.DriftMonitor.load(profile_path, state_path).state["total"] == 1
+
+    # A new crop in the retrained profile invalidates them
+    dm.save_reference_profile(make_profile(crops=("Wheat", "Rice")), profile_path)
+    assert dm.DriftMonitor.load(profile_path, state_path).state["total"] == 0
+
+    # So do different bin layouts
+    dm.record_input(make_input(50.0), profile_path, state_path)
+    shorter = make_profile(crops=("Wheat", "Rice"))
+    shorter["features"]["soil_pH"]["cuts"] = [50.0]
+    dm.save_reference_profile(shorter, profile_path)
+    assert dm.DriftMonitor.load(profile_path, state_path).state["total"] == 0
+
+
+def test_record_input_respects_env_flag(tmp_path, monkeypatch):
+    profile_path = tmp_path / "profile.json"
+    state_path = tmp_path / "state.json"
+    dm.save_reference_profile(make_profile(), profile_path)
+    monkeypatch.setenv(dm.ENABLE_ENV_VAR, "0")
+    dm.record_input(make_input(50.0), profile_path, state_path)
+    assert not state_path.exists()
+
+
+def test_record_input_skips_quietly_when_state_dir_is_read_only(tmp_path, monkeypatch, capsys):
+    profile_path = tmp_path / "profile.json"
+    state_path = tmp_path / "state.json"
+    dm.save_reference_profile(make_profile(), profile_path)
+    monkeypatch.setattr(dm.os, "access", lambda path, mode: False)
+    dm.record_input(make_input(50.0), profile_path, state_path)
+    assert not state_path.exists()
+    assert not Path(str(state_path) + ".lock").exists()
+    assert capsys.readouterr().err == ""
+
+
+def _record_many(args):
+    profile_path, state_path, n = args
+    for _ in range(n):
+        dm.record_input(make_input(50.0), profile_path, state_path)
+
+
+def test_concurrent_record_input_keeps_every_update(tmp_path):
+    profile_path = tmp_path / "profile.json"
+    state_path = tmp_path / "state.json"
+    dm.save_reference_profile(make_profile(), profile_path)
+    with Pool(8) as pool:
+        pool.map(_record_many, [(str(profile_path), str(state_path), 50)] * 8)
+    state = json.loads(state_path.read_text())
+    assert state["total"] == 400
+
+
+def test_old_inputs_decay_out_of_the_window():
+    monitor = dm.DriftMonitor(make_profile())
+    rng = random.Random(0)
+    for _ in range(20000):
+        monitor.update(make_input(rng.uniform(0, 100)))
+    assert not monitor.drift_scores()["needs_retraining"]
+
+    # After long stable traffic a shift still shows within about one window
+    for _ in range(dm.DECAY_WINDOW):
+        monitor.update(make_input(rng.uniform(60, 100)))
+    assert monitor.drift_scores()["needs_retraining"]
+    assert monitor.state["count"] <= dm.DECAY_WINDOW
+
+
+def test_no_drift_detected_for_inputs_sampled_from_reference(dataset, profile):
+    for seed in range(20):
+        rng = random.Random(seed)
+        monitor = dm.DriftMonitor(profile)
+        for n in range(1, 3001):
+            monitor.update(rng.choice(dataset))
+            if n in (100, 1000, 3000):
+                report = monitor.drift_scores()
+                assert not report["needs_retraining"], (seed, n, report["max_psi"])
+
+
+def test_shifted_inputs_are_detected(dataset, profile):
+    rng = random.Random(0)
+    monitor = dm.DriftMonitor(profile)
+    for _ in range(1000):
+        row = dict(rng.choice(dataset))
+        row["soil_moisture_percent"] *= 1.5
+        monitor.update(row)
+    report = monitor.drift_scores()
+    assert report["needs_retraining"]
+    assert report["features"]["soil_moisture_percent"]["psi"] > dm.PSI_THRESHOLD
+    assert math.isfinite(report["max_psi"])
+
+
+def test_crop_without_recent_traffic_stops_being_scored():
+    monitor = dm.DriftMonitor(make_profile(crops=("A", "B")))
+    rng = random.Random(0)
+    for _ in range(1000):
+        monitor.update(make_input(rng.uniform(60, 100), crop="A"))
+    assert "A" in monitor.drift_scores()["crops"]
+
+    # Crop A goes quiet; only clean crop B traffic follows
+    for _ in range(20000):
+        monitor.update(make_input(rng.uniform(0, 100), crop="B"))
+    report = monitor.drift_scores()
+    assert "A" not in report["crops"]
+    assert not report["needs_retraining"], report["max_psi"]
+
+    # When A returns its old histogram is dropped rather than resumed
+    monitor.update(make_input(50.0, crop="A"))
+    assert monitor.state["crops"]["A"]["count"] == 1
+
+
+def test_unseen_crop_rate_is_flagged_before_psi_has_enough_samples():
+    monitor = dm.DriftMonitor(make_profile())
+    n = 0
+    while monitor.state["count"] < dm.MIN_UNSEEN_SAMPLES:
+        monitor.update(make_input(50.0, crop="Unknown" if n % 5 == 0 else "Wheat"))
+        n += 1
+        if monitor.state["count"] < dm.MIN_UNSEEN_SAMPLES:
+            assert not monitor.drift_scores()["needs_retraining"]
+
+    # 20% unseen crops is flagged long before PSI has min_samples to work with
+    report = monitor.drift_scores()
+    assert report["count"] < report["min_samples"]
+    assert report["max_psi"] == 0.0
+    assert report["needs_retraining"]
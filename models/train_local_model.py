@@ -5,7 +5,9 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import RobustScaler, LabelEncoder
 from sklearn.ensemble import GradientBoostingRegressor
 from sklearn.multioutput import MultiOutputRegressor
+from drift_monitor import DriftMonitor, build_reference_profile, save_reference_profile, STATE_PATH
 import os
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -62,6 +64,9 @@ def train_and_save():
 
     df = remove_outliers(df, sensor_features + target_features, threshold=3)
     
+    # Reference profile of the raw inputs, used by drift_monitor at serving time
+    profile = build_reference_profile(df)
+    
     # Feature Engineering
     le = LabelEncoder()
     df['crop_type_encoded'] = le.fit_transform(df['crop_type'])
@@ -103,7 +108,26 @@ def train_and_save():
     joblib.dump(scaler, os.path.join(MODEL_DIR, "feature_scaler.pkl"))
     joblib.dump(le, os.path.join(MODEL_DIR, "crop_type_encoder.pkl"))
     
+    # New reference profile - drop statistics collected against the old model
+    save_reference_profile(profile)
+    if STATE_PATH.exists():
+        STATE_PATH.unlink()
+    
     print("✓ Model artifacts saved successfully.")
 
+def needs_retraining():
+    """Check the serving-time drift scores; retrain if no profile exists yet"""
+    monitor = DriftMonitor.load()
+    if monitor is None:
+        return True
+    report = monitor.drift_scores()
+    print(f"Drift check: {report['count']} recent inputs, max PSI {report['max_psi']}, "
+          f"unseen crop rate {report['unseen_crop_rate']}")
+    return report["needs_retraining"]
+
 if __name__ == "__main__":
-    train_and_save()
+    # --if-drifted: only retrain when the serving inputs have drifted from the training data
+    if "--if-drifted" in sys.argv[1:] and not needs_retraining():
+        print("No significant drift detected. Skipping retraining.")
+    else:
+        train_and_save()